@@ -0,0 +1,136 @@
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from shared.logger import StructuredLogger, JSONFormatter, NonBlockingQueueHandler, SamplingFilter
+
+EVENTS = 20000
+SLOW_EVENTS = 2000
+SLOW_SINK_BYTES_PER_SECOND = 256 * 1024
+
+# Roughly what task.queued carries, with a payload of a few KB
+MESSAGE = {
+    "workflow_id": "5f0c6a4e-3b1d-4c7a-9f55-0d7b3c2a1e90",
+    "task_id": "a8e2d1c4-6b7f-4e3a-8d9c-1f2e3d4c5b6a",
+    "task_name": "Task 1 (Normal)",
+    "task_type": "HTTP_REQUEST",
+    "payload": {"items": [{"id": i, "value": "x" * 32} for i in range(64)]},
+}
+
+def make_logger(name, cls):
+    logging.setLoggerClass(cls)
+    try:
+        logger = logging.getLogger(name)
+    finally:
+        logging.setLoggerClass(logging.Logger)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+class SlowSink:
+    """
+    A pipe drained by a reader thread at a fixed rate, like stdout behind a slow log collector:
+    once the pipe buffer is full, every write blocks until the reader catches up.
+    """
+
+    def __init__(self, bytes_per_second: int):
+        read_fd, write_fd = os.pipe()
+        self.stream = os.fdopen(write_fd, "w")
+        self.reader = threading.Thread(target=self._drain, args=(read_fd, bytes_per_second), daemon=True)
+        self.reader.start()
+
+    @staticmethod
+    def _drain(read_fd: int, bytes_per_second: int):
+        with os.fdopen(read_fd, "rb") as pipe:
+            while True:
+                chunk = pipe.read1(4096)
+                if not chunk:
+                    return
+                time.sleep(len(chunk) / bytes_per_second)
+
+    def close(self):
+        self.stream.close()
+        self.reader.join()
+
+def bench_sync(sink):
+    """The previous behaviour: full payload formatted and written synchronously by the caller."""
+    logger = make_logger("bench.sync", logging.Logger)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+    start = time.perf_counter()
+    for _ in range(EVENTS):
+        logger.info(f"Published to task.queued: {MESSAGE}")
+    return time.perf_counter() - start, 0.0
+
+def bench_sync_by_reference(sink, name="bench.sync_ref", events=EVENTS):
+    """Same structured, by-reference record as the queued cases, but encoded and written by the caller."""
+    logger = make_logger(name, StructuredLogger)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(JSONFormatter())
+    logger.addHandler(handler)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        logger.info("Published to %s", "task.queued", extra={
+            "workflow_id": MESSAGE["workflow_id"],
+            "task_id": MESSAGE["task_id"],
+            "bytes": 2600,
+        })
+    return time.perf_counter() - start, 0.0
+
+def bench_queued(sink, name, rate_limit=None, events=EVENTS):
+    """The queue pipeline, logging the event by reference."""
+    logger = make_logger(name, StructuredLogger)
+    log_queue = queue.Queue(maxsize=events + 1)
+    stream_handler = logging.StreamHandler(sink)
+    stream_handler.setFormatter(JSONFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    if rate_limit is not None:
+        logger.addFilter(SamplingFilter(rate_limit=rate_limit))
+
+    start = time.perf_counter()
+    for _ in range(events):
+        logger.info("Published to %s", "task.queued", extra={
+            "workflow_id": MESSAGE["workflow_id"],
+            "task_id": MESSAGE["task_id"],
+            "bytes": 2600,
+        })
+    caller = time.perf_counter() - start
+    listener.stop()
+    return caller, time.perf_counter() - start
+
+def run_benchmark():
+    with open(os.devnull, "w") as sink:
+        results = [
+            ("sync, full payload", EVENTS, *bench_sync(sink)),
+            ("sync, by reference", EVENTS, *bench_sync_by_reference(sink)),
+            ("queued, by reference", EVENTS, *bench_queued(sink, "bench.queued")),
+            ("queued, rate limited 50/s", EVENTS, *bench_queued(sink, "bench.limited", rate_limit=50.0)),
+        ]
+
+    # A sink that cannot keep up: the sync handler stalls the caller on every full pipe buffer,
+    # the queued one only stalls its writer thread
+    for name, bench in (
+        ("sync, slow sink", lambda sink: bench_sync_by_reference(sink, "bench.slow_sync", events=SLOW_EVENTS)),
+        ("queued, slow sink", lambda sink: bench_queued(sink, "bench.slow_queued", events=SLOW_EVENTS)),
+    ):
+        slow_sink = SlowSink(SLOW_SINK_BYTES_PER_SECOND)
+        try:
+            results.append((name, SLOW_EVENTS, *bench(slow_sink.stream)))
+        finally:
+            slow_sink.close()
+
+    print(f"publish log records ({SLOW_SINK_BYTES_PER_SECOND // 1024} KB/s for the slow sink)")
+    print(f"{'pipeline':<28}{'events':>8}{'caller us/event':>18}{'drained after s':>18}")
+    for name, events, caller, drained in results:
+        drained_text = f"{drained:.3f}" if drained else "-"
+        print(f"{name:<28}{events:>8}{caller / events * 1e6:>18.2f}{drained_text:>18}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,15 +1,26 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime
 from fastapi import FastAPI, HTTPException, Depends
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from shared.database import get_db, init_db
-from shared.models import Workflow, Task
-from shared.schemas import WorkflowCreate, WorkflowResponse
+from shared.models import Workflow, Task, WorkflowTemplate
+from shared.schemas import (
+    WorkflowCreate, WorkflowResponse, TraceBreakdown,
+    WorkflowTemplateCreate, WorkflowTemplateResponse, WorkflowRunCreate,
+)
+from shared.templates import ExecutionPlan, compile_plan, plan_cache
 from shared.event_bus import event_bus
+from shared.tracing import Tracer, span_store, trace_id_for, to_otlp, critical_path
 from shared.logger import setup_logger
 from contextlib import asynccontextmanager
 
 logger = setup_logger("api_gateway")
+tracer = Tracer("api-gateway")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -33,34 +44,43 @@ app.add_middleware(
 @app.post("/workflows", response_model=WorkflowResponse)
 async def create_workflow(workflow: WorkflowCreate, db: AsyncSession = Depends(get_db)):
     logger.info(f"Creating workflow: {workflow.name}")
-    
-    # Create workflow record
-    db_workflow = Workflow(name=workflow.name, status="PENDING")
-    
-    # Create task records
-    for task_data in workflow.tasks:
-        db_task = Task(
-            name=task_data.name,
-            task_type=task_data.task_type,
-            payload=task_data.payload,
-            next_task=task_data.next_task,
-            max_retries=task_data.max_retries,
-            workflow=db_workflow
-        )
-        db_workflow.tasks.append(db_task)
-    
-    db.add(db_workflow)
-    await db.commit()
-    await db.refresh(db_workflow) # This might not load relationships immediately
 
-    # Re-fetch with relationship to ensure selectinload
-    stmt = select(Workflow).options(selectinload(Workflow.tasks)).where(Workflow.id == db_workflow.id)
-    result = await db.execute(stmt)
-    db_workflow_loaded = result.scalar_one()
+    # The workflow id doubles as the trace id, so it is assigned up front
+    workflow_id = uuid.uuid4()
+
+    async with tracer.span("gateway.create_workflow", trace_id=trace_id_for(workflow_id), workflow_id=str(workflow_id)):
+        # Tasks are partitioned by the workflow's created_at so they land in its partition
+        created_at = datetime.utcnow()
+
+        # Create workflow record
+        db_workflow = Workflow(id=workflow_id, name=workflow.name, status="PENDING", created_at=created_at)
+
+        # Create task records
+        for task_data in workflow.tasks:
+            db_task = Task(
+                workflow_created_at=created_at,
+                name=task_data.name,
+                task_type=task_data.task_type,
+                payload=task_data.payload,
+                next_task=task_data.next_task,
+                max_retries=task_data.max_retries,
+                workflow=db_workflow
+            )
+            db_workflow.tasks.append(db_task)
+
+        async with tracer.span("gateway.commit", task_count=len(workflow.tasks)):
+            db.add(db_workflow)
+            await db.commit()
+            await db.refresh(db_workflow) # This might not load relationships immediately
+
+        # Re-fetch with relationship to ensure selectinload
+        stmt = select(Workflow).options(selectinload(Workflow.tasks)).where(Workflow.id == db_workflow.id)
+        result = await db.execute(stmt)
+        db_workflow_loaded = result.scalar_one()
+
+        # Publish event
+        await event_bus.publish("workflow.created", {"workflow_id": str(db_workflow_loaded.id)})
 
-    # Publish event
-    await event_bus.publish("workflow.created", {"workflow_id": str(db_workflow_loaded.id)})
-    
     return db_workflow_loaded
 
 @app.get("/workflows/{workflow_id}", response_model=WorkflowResponse)
@@ -76,7 +96,127 @@ async def get_workflow(workflow_id: str, db: AsyncSession = Depends(get_db)):
 
 @app.get("/workflows", response_model=list[WorkflowResponse])
 async def list_workflows(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
-    stmt = select(Workflow).options(selectinload(Workflow.tasks)).offset(skip).limit(limit)
+    stmt = (
+        select(Workflow)
+        .options(selectinload(Workflow.tasks))
+        .order_by(Workflow.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
     result = await db.execute(stmt)
     workflows = result.scalars().all()
     return workflows
+
+@app.get("/workflows/{workflow_id}/trace")
+async def get_workflow_trace(workflow_id: uuid.UUID):
+    """Returns every recorded span of the workflow as an OTLP/JSON export."""
+    spans = await span_store.load(trace_id_for(workflow_id))
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return to_otlp(spans)
+
+@app.get("/workflows/{workflow_id}/trace/breakdown", response_model=TraceBreakdown)
+async def get_workflow_trace_breakdown(workflow_id: uuid.UUID):
+    trace_id = trace_id_for(workflow_id)
+    spans = await span_store.load(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+
+    path = critical_path(spans)
+    stages = defaultdict(float)
+    for segment in path:
+        stages[segment["name"]] += segment["duration_ms"]
+
+    return TraceBreakdown(
+        workflow_id=workflow_id,
+        trace_id=trace_id,
+        total_ms=sum(segment["duration_ms"] for segment in path),
+        stages=dict(stages),
+        critical_path=path,
+    )
+
+# --- Templates ---
+
+def template_response(template: WorkflowTemplate, plan: ExecutionPlan) -> WorkflowTemplateResponse:
+    return WorkflowTemplateResponse(
+        id=template.id,
+        version=template.version,
+        name=template.name,
+        tasks=template.tasks,
+        start_tasks=list(plan.start_tasks),
+        parameters=sorted(plan.parameters),
+        created_at=template.created_at,
+    )
+
+@app.post("/templates", response_model=WorkflowTemplateResponse)
+async def register_template(template: WorkflowTemplateCreate, db: AsyncSession = Depends(get_db)):
+    """Registers a new immutable version of a template, validating and compiling it once."""
+    latest = await db.scalar(select(func.max(WorkflowTemplate.version)).where(WorkflowTemplate.id == template.id))
+    version = (latest or 0) + 1
+    tasks = [t.model_dump() for t in template.tasks]
+
+    try:
+        plan = compile_plan(template.id, version, template.name, tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    db_template = WorkflowTemplate(id=template.id, version=version, name=template.name, tasks=tasks)
+    db.add(db_template)
+    try:
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Template version was registered concurrently, retry")
+
+    plan_cache.put(plan)
+    logger.info(f"Registered template {template.id} v{version}")
+    return template_response(db_template, plan)
+
+async def get_template_version(db: AsyncSession, template_id: str, version: int = None) -> WorkflowTemplateResponse:
+    plan = await plan_cache.get(db, template_id, version)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Template not found")
+    result = await db.execute(
+        select(WorkflowTemplate).where(WorkflowTemplate.id == template_id, WorkflowTemplate.version == plan.version)
+    )
+    return template_response(result.scalar_one(), plan)
+
+@app.get("/templates/{template_id}", response_model=WorkflowTemplateResponse)
+async def get_template(template_id: str, db: AsyncSession = Depends(get_db)):
+    return await get_template_version(db, template_id)
+
+@app.get("/templates/{template_id}/versions/{version}", response_model=WorkflowTemplateResponse)
+async def get_template_by_version(template_id: str, version: int, db: AsyncSession = Depends(get_db)):
+    return await get_template_version(db, template_id, version)
+
+@app.post("/templates/{template_id}/runs", response_model=WorkflowResponse)
+async def run_template(template_id: str, run: WorkflowRunCreate, db: AsyncSession = Depends(get_db)):
+    """Starts a workflow from a template. Only the workflow row is inserted; task rows are created as tasks are queued."""
+    plan = await plan_cache.get(db, template_id, run.version)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    missing = plan.missing_parameters(run.parameters)
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing parameters: {', '.join(missing)}")
+
+    workflow_id = uuid.uuid4()
+    async with tracer.span("gateway.create_workflow", trace_id=trace_id_for(workflow_id), workflow_id=str(workflow_id), template_id=template_id):
+        db_workflow = Workflow(
+            id=workflow_id,
+            name=run.name or plan.name,
+            status="PENDING",
+            created_at=datetime.utcnow(),
+            template_id=plan.template_id,
+            template_version=plan.version,
+            parameters=run.parameters,
+            tasks=[],
+        )
+
+        async with tracer.span("gateway.commit", task_count=0):
+            db.add(db_workflow)
+            await db.commit()
+
+        await event_bus.publish("workflow.created", {"workflow_id": str(workflow_id)})
+
+    logger.info(f"Started workflow {workflow_id} from template {plan.template_id} v{plan.version}")
+    return db_workflow
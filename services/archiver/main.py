@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from shared.database import engine, async_session_factory
+from shared.models import Workflow, Task, TERMINAL_WORKFLOW_STATUSES
+from shared.schemas import WorkflowResponse
+from shared.partitions import ensure_partitions, list_partitions, drop_partition, add_months
+from shared.settings import settings
+from shared.logger import setup_logger
+
+logger = setup_logger("archiver")
+
+ARCHIVE_INTERVAL_SECONDS = 3600
+
+def serialize(workflows):
+    return [WorkflowResponse.model_validate(wf).model_dump(mode="json") for wf in workflows]
+
+def write_archive(path, records):
+    # gzip members can be concatenated, so every batch is appended as its own member
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+async def archive_partition(start: datetime) -> bool:
+    """Archives a whole monthly partition and drops it. Skipped while it still holds live workflows."""
+    end = add_months(start, 1)
+    in_range = (Workflow.created_at >= start, Workflow.created_at < end)
+
+    async with async_session_factory() as db:
+        pending = await db.scalar(
+            select(func.count()).select_from(Workflow)
+            .where(*in_range, Workflow.status.notin_(TERMINAL_WORKFLOW_STATUSES))
+        )
+        if pending:
+            logger.info(f"Partition {start:%Y-%m} still has {pending} live workflows, archiving row by row")
+            return False
+
+        path = os.path.join(settings.ARCHIVE_DIR, f"workflows_{start:%Y%m}.jsonl.gz")
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        # Keyset pagination keeps memory flat regardless of partition size
+        last_key = None
+        archived = 0
+        while True:
+            stmt = (
+                select(Workflow)
+                .options(selectinload(Workflow.tasks))
+                .where(*in_range)
+                .order_by(Workflow.created_at, Workflow.id)
+                .limit(settings.ARCHIVE_BATCH_SIZE)
+            )
+            if last_key:
+                stmt = stmt.where(tuple_(Workflow.created_at, Workflow.id) > last_key)
+            batch = (await db.execute(stmt)).scalars().all()
+            if not batch:
+                break
+
+            await asyncio.to_thread(write_archive, tmp_path, serialize(batch))
+            archived += len(batch)
+            last_key = (batch[-1].created_at, batch[-1].id)
+            db.expunge_all()
+
+    if archived:
+        os.replace(tmp_path, path)
+
+    async with engine.begin() as conn:
+        task_partitions = await list_partitions(conn, "tasks")
+        if start in task_partitions:
+            await drop_partition(conn, "tasks", start)
+        await drop_partition(conn, "workflows", start)
+
+    logger.info(f"Archived {archived} workflows from partition {start:%Y-%m}")
+    return True
+
+async def archive_expired_workflows(cutoff: datetime):
+    """Archives and deletes terminal workflows older than the cutoff that are not covered by a partition drop."""
+    path = os.path.join(settings.ARCHIVE_DIR, f"workflows_{datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz")
+    archived = 0
+
+    while True:
+        async with async_session_factory() as db:
+            stmt = (
+                select(Workflow)
+                .options(selectinload(Workflow.tasks))
+                .where(Workflow.created_at < cutoff, Workflow.status.in_(TERMINAL_WORKFLOW_STATUSES))
+                .order_by(Workflow.created_at)
+                .limit(settings.ARCHIVE_BATCH_SIZE)
+            )
+            batch = (await db.execute(stmt)).scalars().all()
+            if not batch:
+                break
+
+            # Write before deleting: a crash in between duplicates records rather than losing them
+            await asyncio.to_thread(write_archive, path, serialize(batch))
+
+            ids = [wf.id for wf in batch]
+            await db.execute(
+                delete(Task).where(Task.workflow_id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                delete(Workflow).where(Workflow.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            archived += len(batch)
+
+    if archived:
+        logger.info(f"Archived {archived} expired workflows to {path}")
+
+async def run_retention():
+    logger.info("Running retention job...")
+    try:
+        # Keep partitions rolling forward so new rows never land in the default partition
+        async with engine.begin() as conn:
+            await ensure_partitions(conn)
+            workflow_partitions = await list_partitions(conn, "workflows")
+
+        cutoff = datetime.utcnow() - timedelta(days=settings.RETENTION_DAYS)
+        for start in workflow_partitions:
+            if add_months(start, 1) <= cutoff:
+                await archive_partition(start)
+
+        await archive_expired_workflows(cutoff)
+
+    except Exception as e:
+        logger.error(f"Error running retention job: {e}")
+
+async def main():
+    logger.info("Starting Archiver...")
+    os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+    while True:
+        await run_retention()
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    asyncio.run(main())
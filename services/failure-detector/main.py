@@ -4,9 +4,11 @@ from sqlalchemy.future import select
 from shared.database import async_session_factory
 from shared.models import Task
 from shared.event_bus import event_bus
+from shared.tracing import Tracer, trace_id_for
 from shared.logger import setup_logger
 
 logger = setup_logger("failure_detector")
+tracer = Tracer("failure-detector")
 
 STALE_TASK_TIMEOUT_SECONDS = 30 
 
@@ -21,17 +23,19 @@ async def check_stale_tasks():
             stale_tasks = result.scalars().all()
 
             for task in stale_tasks:
-                logger.warning(f"Detected stale task {task.id} ({task.name}). Marking as FAILED.")
-                task.status = "FAILED"
-                task.error = "Task execution timed out (Stale)"
-                await db.commit()
-                
-                # Publish event
-                await event_bus.publish("task.failed", {
-                    "workflow_id": str(task.workflow_id),
-                    "task_id": str(task.id),
-                    "error": task.error
-                })
+                # No inbound event here; the span joins the workflow's trace by id
+                async with tracer.span("failure_detector.mark_stale", trace_id=trace_id_for(task.workflow_id), task_id=str(task.id)):
+                    logger.warning(f"Detected stale task {task.id} ({task.name}). Marking as FAILED.")
+                    task.status = "FAILED"
+                    task.error = "Task execution timed out (Stale)"
+                    await db.commit()
+                    
+                    # Publish event
+                    await event_bus.publish("task.failed", {
+                        "workflow_id": str(task.workflow_id),
+                        "task_id": str(task.id),
+                        "error": task.error
+                    })
 
     except Exception as e:
         logger.error(f"Error checking stale tasks: {e}")
@@ -1,13 +1,12 @@
 import asyncio
-import json
 from shared.event_bus import event_bus
 from shared.logger import setup_logger
 
 logger = setup_logger("notification_service")
 
 async def log_event(channel, message):
-    data = json.loads(message["data"])
-    logger.info(f"NOTIFICATION [{channel}]: {json.dumps(data, indent=2)}")
+    # The raw event is already JSON; it is logged as-is and truncated by the logger if large
+    logger.info("NOTIFICATION [%s]", channel, extra={"event": message["data"]})
 
 async def main():
     logger.info("Starting Notification Service...")
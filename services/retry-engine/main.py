@@ -2,56 +2,64 @@ import asyncio
 import json
 from sqlalchemy.future import select
 from shared.database import async_session_factory
-from shared.models import Task
+from shared.models import Workflow, Task
 from shared.event_bus import event_bus
+from shared.tracing import Tracer, trace_id_from
 from shared.logger import setup_logger
 
 logger = setup_logger("retry_engine")
+tracer = Tracer("retry-engine")
 
 async def process_task_failed(message):
     try:
         data = json.loads(message["data"])
         task_id = data.get("task_id")
         
-        async with async_session_factory() as db:
-            result = await db.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one_or_none()
+        parent = await tracer.consume("task.failed", data)
+        async with tracer.span("retry.handle_failure", parent=parent, trace_id=trace_id_from(data), task_id=task_id):
+            async with async_session_factory() as db:
+                result = await db.execute(select(Task).where(Task.id == task_id))
+                task = result.scalar_one_or_none()
             
-            if not task:
-                logger.error(f"Task {task_id} not found")
-                return
+                if not task:
+                    logger.error(f"Task {task_id} not found")
+                    return
             
-            if task.retry_count < task.max_retries:
-                # Exponential backoff (simulated with sleep? Or just schedule?)
-                # For demo, just immediate or short delay
-                wait_time = 2 ** task.retry_count
-                logger.info(f"Retrying task {task.id} in {wait_time}s (Attempt {task.retry_count + 1}/{task.max_retries})")
+                if task.retry_count < task.max_retries:
+                    # Exponential backoff (simulated with sleep? Or just schedule?)
+                    # For demo, just immediate or short delay
+                    wait_time = 2 ** task.retry_count
+                    logger.info(f"Retrying task {task.id} in {wait_time}s (Attempt {task.retry_count + 1}/{task.max_retries})")
                 
-                await asyncio.sleep(wait_time)
+                    async with tracer.span("retry.backoff", wait_seconds=wait_time):
+                        await asyncio.sleep(wait_time)
                 
-                task.retry_count += 1
-                task.status = "QUEUED"
-                task.error = None # Clear error
-                await db.commit()
+                    async with tracer.span("retry.requeue", retry_count=task.retry_count + 1):
+                        task.retry_count += 1
+                        task.status = "QUEUED"
+                        task.error = None # Clear error
+                        await db.commit()
                 
-                await event_bus.publish("task.queued", {
-                    "workflow_id": str(task.workflow_id),
-                    "task_id": str(task.id),
-                    "task_name": task.name,
-                    "task_type": task.task_type,
-                    "payload": task.payload
-                })
-                await event_bus.publish("task.retry", {
-                    "workflow_id": str(task.workflow_id),
-                    "task_id": str(task.id),
-                     "retry_count": task.retry_count
-                })
-            else:
-                logger.error(f"Task {task.id} exceeded max retries. Workflow failed.")
-                # Mark workflow as failed?
-                # Ideally we should traverse up to workflow and mark it.
-                # But let's keep it simple.
-                pass
+                        await event_bus.publish("task.queued", {
+                            "workflow_id": str(task.workflow_id),
+                            "task_id": str(task.id),
+                            "task_name": task.name,
+                            "task_type": task.task_type,
+                            "payload": task.payload
+                        })
+                        await event_bus.publish("task.retry", {
+                            "workflow_id": str(task.workflow_id),
+                            "task_id": str(task.id),
+                             "retry_count": task.retry_count
+                        })
+                else:
+                    logger.error(f"Task {task.id} exceeded max retries. Workflow failed.")
+                    # Mark the workflow terminal so the archiver can retire it
+                    wf_result = await db.execute(select(Workflow).where(Workflow.id == task.workflow_id))
+                    workflow = wf_result.scalar_one_or_none()
+                    if workflow:
+                        workflow.status = "FAILED"
+                        await db.commit()
 
     except Exception as e:
         logger.error(f"Error processing task failure: {e}")
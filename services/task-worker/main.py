@@ -6,87 +6,126 @@ from sqlalchemy.orm import selectinload
 from shared.database import async_session_factory
 from shared.models import Workflow, Task
 from shared.event_bus import event_bus
+from shared.tracing import Tracer, trace_id_from
+from shared.templates import plan_cache, insert_queued_task
 from shared.logger import setup_logger
 
 logger = setup_logger("task_worker")
+tracer = Tracer("task-worker")
 
 async def process_task(message):
+    # A malformed message must never take down the subscribe loop
     try:
         data = json.loads(message["data"])
+        parent = await tracer.consume("task.queued", data)
+        async with tracer.span("worker.process_task", parent=parent, trace_id=trace_id_from(data), task_id=data.get("task_id")):
+            await run_task(data)
+    except Exception as e:
+        logger.error(f"Error processing task message: {e}")
+
+async def run_task(data):
+    try:
         task_id = data.get("task_id")
-        
+
         async with async_session_factory() as db:
-            result = await db.execute(select(Task).where(Task.id == task_id))
-            task = result.scalar_one_or_none()
+            async with tracer.span("worker.claim"):
+                result = await db.execute(select(Task).where(Task.id == task_id))
+                task = result.scalar_one_or_none()
 
-            if not task:
-                logger.error(f"Task {task_id} not found")
-                return
+                if not task:
+                    logger.error(f"Task {task_id} not found")
+                    return
 
-            if task.status not in ["QUEUED", "PENDING"]:
-                logger.warning(f"Task {task_id} is {task.status}, skipping")
-                return
+                if task.status not in ["QUEUED", "PENDING"]:
+                    logger.warning(f"Task {task_id} is {task.status}, skipping")
+                    return
+
+                task.status = "RUNNING"
+                await db.commit()
 
-            task.status = "RUNNING"
-            await db.commit()
-            
             logger.info(f"Executing task: {task.name} ({task.id})")
-            
-            # Simulate work
-            await asyncio.sleep(1) # mock processing time
-
-            # Check for simulated failure
-            payload = task.payload or {}
-            if payload.get("simulate_failure", False):
-                # Only fail if we haven't maxed out retries? 
-                # actually failure detector/retry engine handles the retry logic.
-                # Here we just fail.
-                raise Exception("Simulated Failure")
-
-            task.status = "COMPLETED"
-            task.result = {"status": "success", "processed": True}
-            await db.commit()
-
-            await event_bus.publish("task.completed", {
-                "workflow_id": str(task.workflow_id),
-                "task_id": str(task.id),
-                "task_name": task.name
-            })
-            logger.info(f"Task {task.id} completed")
-
-            # Trigger next task if exists
-            if task.next_task:
-                # Find the next task by name in the same workflow
-                # We need to query the workflow's tasks
-                # Using a fresh query to avoid stale relation issues
-                # Note: This is an async query inside the session
-                stmt = select(Task).where(Task.workflow_id == task.workflow_id, Task.name == task.next_task)
-                next_task_result = await db.execute(stmt)
-                next_task_obj = next_task_result.scalar_one_or_none()
-                
-                if next_task_obj:
-                    next_task_obj.status = "QUEUED"
+
+            async with tracer.span("worker.execute", task_type=task.task_type):
+                # Simulate work
+                await asyncio.sleep(1) # mock processing time
+
+                # Check for simulated failure
+                payload = task.payload or {}
+                if payload.get("simulate_failure", False):
+                    # Only fail if we haven't maxed out retries?
+                    # actually failure detector/retry engine handles the retry logic.
+                    # Here we just fail.
+                    raise Exception("Simulated Failure")
+
+            async with tracer.span("worker.complete"):
+                task.status = "COMPLETED"
+                task.result = {"status": "success", "processed": True}
+                await db.commit()
+
+                await event_bus.publish("task.completed", {
+                    "workflow_id": str(task.workflow_id),
+                    "task_id": str(task.id),
+                    "task_name": task.name
+                })
+                logger.info(f"Task {task.id} completed")
+
+                # Trigger next task if exists
+                if task.next_task and task.template_id:
+                    # Template runs insert the successor straight from the cached plan, in one
+                    # statement; the run's parameters are carried on the task row
+                    plan = await plan_cache.get(db, task.template_id, task.template_version)
+                    if not plan:
+                        logger.error(f"Template {task.template_id} v{task.template_version} not found for workflow {task.workflow_id}")
+                        return
+                    values = plan.task_values(
+                        plan.successors[task.name], task.workflow_id, task.workflow_created_at, task.parameters or {}
+                    )
+                    next_task_id = await insert_queued_task(db, values)
                     await db.commit()
-                    await event_bus.publish("task.queued", {
-                        "workflow_id": str(next_task_obj.workflow_id),
-                        "task_id": str(next_task_obj.id),
-                        "task_name": next_task_obj.name,
-                        "task_type": next_task_obj.task_type,
-                        "payload": next_task_obj.payload
-                    })
-                    logger.info(f"Triggered next task: {next_task_obj.name}")
+
+                    if next_task_id is None:
+                        logger.warning(f"Next task {values['name']} already queued for workflow {task.workflow_id}")
+                    else:
+                        await event_bus.publish("task.queued", {
+                            "workflow_id": str(task.workflow_id),
+                            "task_id": str(next_task_id),
+                            "task_name": values["name"],
+                            "task_type": values["task_type"],
+                            "payload": values["payload"]
+                        })
+                        logger.info(f"Triggered next task: {values['name']}")
+                elif task.next_task:
+                    # Find the next task by name in the same workflow
+                    # We need to query the workflow's tasks
+                    # Using a fresh query to avoid stale relation issues
+                    # Note: This is an async query inside the session
+                    stmt = select(Task).where(Task.workflow_id == task.workflow_id, Task.name == task.next_task)
+                    next_task_result = await db.execute(stmt)
+                    next_task_obj = next_task_result.scalar_one_or_none()
+
+                    if next_task_obj:
+                        next_task_obj.status = "QUEUED"
+                        await db.commit()
+                        await event_bus.publish("task.queued", {
+                            "workflow_id": str(next_task_obj.workflow_id),
+                            "task_id": str(next_task_obj.id),
+                            "task_name": next_task_obj.name,
+                            "task_type": next_task_obj.task_type,
+                            "payload": next_task_obj.payload
+                        })
+                        logger.info(f"Triggered next task: {next_task_obj.name}")
+                    else:
+                        logger.error(f"Next task {task.next_task} not found for workflow {task.workflow_id}")
                 else:
-                    logger.error(f"Next task {task.next_task} not found for workflow {task.workflow_id}")
-            else:
-                 # Check if workflow is complete (no running tasks)
-                 # This is a bit simplistic, but valid for a chain.
-                 # Updated workflow status
-                 wf_stmt = select(Workflow).where(Workflow.id == task.workflow_id)
-                 wf_result = await db.execute(wf_stmt)
-                 wf = wf_result.scalar_one()
-                 wf.status = "COMPLETED"
-                 await db.commit()
-                 logger.info(f"Workflow {wf.id} completed")
+                     # Check if workflow is complete (no running tasks)
+                     # This is a bit simplistic, but valid for a chain.
+                     # Updated workflow status
+                     wf_stmt = select(Workflow).where(Workflow.id == task.workflow_id)
+                     wf_result = await db.execute(wf_stmt)
+                     wf = wf_result.scalar_one()
+                     wf.status = "COMPLETED"
+                     await db.commit()
+                     logger.info(f"Workflow {wf.id} completed")
 
     except Exception as e:
         logger.error(f"Task failed: {e}")
@@ -99,7 +138,7 @@ async def process_task(message):
                     failed_task.status = "FAILED"
                     failed_task.error = str(e)
                     await error_db.commit()
-                    
+
                     await event_bus.publish("task.failed", {
                         "workflow_id": str(failed_task.workflow_id),
                         "task_id": str(failed_task.id),
@@ -111,7 +150,7 @@ async def process_task(message):
 async def main():
     logger.info("Starting Task Worker...")
     pubsub = await event_bus.subscribe("task.queued")
-    
+
     async for message in pubsub.listen():
         if message["type"] == "message":
             # Process in background task to not block the listener?
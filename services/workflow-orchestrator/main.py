@@ -1,13 +1,16 @@
 import asyncio
 import json
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, noload
 from shared.database import async_session_factory
 from shared.models import Workflow, Task
 from shared.event_bus import event_bus
+from shared.tracing import Tracer, trace_id_for
+from shared.templates import plan_cache, insert_queued_task
 from shared.logger import setup_logger
 
 logger = setup_logger("workflow_orchestrator")
+tracer = Tracer("workflow-orchestrator")
 
 async def process_workflow_created(message):
     try:
@@ -15,51 +18,81 @@ async def process_workflow_created(message):
         workflow_id = data["workflow_id"]
         logger.info(f"Processing new workflow: {workflow_id}")
 
-        async with async_session_factory() as db:
-            # Fetch workflow with tasks
-            stmt = select(Workflow).options(selectinload(Workflow.tasks)).where(Workflow.id == workflow_id)
-            result = await db.execute(stmt)
-            workflow = result.scalar_one_or_none()
+        parent = await tracer.consume("workflow.created", data)
+        async with tracer.span("orchestrator.start_workflow", parent=parent, trace_id=trace_id_for(workflow_id), workflow_id=workflow_id):
+            async with async_session_factory() as db:
+                # Template runs have no task rows yet, so tasks are only loaded for inline workflows
+                stmt = select(Workflow).options(noload(Workflow.tasks)).where(Workflow.id == workflow_id)
+                result = await db.execute(stmt)
+                workflow = result.scalar_one_or_none()
 
-            if not workflow:
-                logger.error(f"Workflow {workflow_id} not found")
-                return
+                if not workflow:
+                    logger.error(f"Workflow {workflow_id} not found")
+                    return
 
-            # Find the first task (no dependencies or simplistically the first one if linear)
-            # For this simplified engine, we assume the first task in the list is the start 
-            # OR the one that is not a 'next_task' of any other task. 
-            # But the prompt says "Tasks... next_task". 
-            # Let's find the task that is NOT anyone's next_task, or just pick the first one blindly if simple.
-            # A better approach for a linear chain: find task where name is not in [t.next_task for t in tasks]
+                if workflow.template_id:
+                    # Start tasks are precomputed in the cached plan; task rows are only created once queued
+                    plan = await plan_cache.get(db, workflow.template_id, workflow.template_version)
+                    if not plan:
+                        logger.error(f"Template {workflow.template_id} v{workflow.template_version} not found for workflow {workflow_id}")
+                        return
+                    for name in plan.start_tasks:
+                        values = plan.task_values(name, workflow.id, workflow.created_at, workflow.parameters or {})
+                        task_id = await insert_queued_task(db, values)
+                        await db.commit()
+                        # A redelivered workflow.created finds the rows of the first delivery
+                        if task_id is None:
+                            logger.warning(f"Start task {name} already queued for workflow {workflow_id}")
+                            continue
+                        await event_bus.publish("task.queued", {
+                            "workflow_id": str(workflow.id),
+                            "task_id": str(task_id),
+                            "task_name": values["name"],
+                            "task_type": values["task_type"],
+                            "payload": values["payload"]
+                        })
+                        logger.info(f"Queued task {task_id} ({name})")
+                else:
+                    tasks_result = await db.execute(
+                        select(Task).where(Task.workflow_id == workflow.id).order_by(Task.created_at)
+                    )
+                    tasks = tasks_result.scalars().all()
+
+                    # Find the first task (no dependencies or simplistically the first one if linear)
+                    # For this simplified engine, we assume the first task in the list is the start 
+                    # OR the one that is not a 'next_task' of any other task. 
+                    # But the prompt says "Tasks... next_task". 
+                    # Let's find the task that is NOT anyone's next_task, or just pick the first one blindly if simple.
+                    # A better approach for a linear chain: find task where name is not in [t.next_task for t in tasks]
             
-            all_next_tasks = {t.next_task for t in workflow.tasks if t.next_task}
-            start_tasks = [t for t in workflow.tasks if t.name not in all_next_tasks]
+                    all_next_tasks = {t.next_task for t in tasks if t.next_task}
+                    start_tasks = [t for t in tasks if t.name not in all_next_tasks]
             
-            if not start_tasks:
-                 # Fallback: just pick the first one if circular or ambiguous
-                 if workflow.tasks:
-                     start_tasks = [workflow.tasks[0]]
-                 else:
-                     logger.warning(f"Workflow {workflow_id} has no tasks")
-                     workflow.status = "COMPLETED"
-                     await db.commit()
-                     return
+                    if not start_tasks:
+                         # Fallback: just pick the first one if circular or ambiguous
+                         if tasks:
+                             start_tasks = [tasks[0]]
+                         else:
+                             logger.warning(f"Workflow {workflow_id} has no tasks")
+                             workflow.status = "COMPLETED"
+                             await db.commit()
+                             return
 
-            for task in start_tasks:
-                task.status = "QUEUED"
-                await db.commit()
-                # Publish task.queued to trigger execution
-                await event_bus.publish("task.queued", {
-                    "workflow_id": str(workflow.id),
-                    "task_id": str(task.id),
-                    "task_name": task.name,
-                    "task_type": task.task_type,
-                    "payload": task.payload
-                })
-                logger.info(f"Queued task {task.id} ({task.name})")
+                    for task in start_tasks:
+                        task.status = "QUEUED"
+                        await db.commit()
+                        # Publish task.queued to trigger execution
+                        await event_bus.publish("task.queued", {
+                            "workflow_id": str(workflow.id),
+                            "task_id": str(task.id),
+                            "task_name": task.name,
+                            "task_type": task.task_type,
+                            "payload": task.payload
+                        })
+                        logger.info(f"Queued task {task.id} ({task.name})")
 
-            workflow.status = "RUNNING"
-            await db.commit()
+                workflow.status = "RUNNING"
+                await db.commit()
 
     except Exception as e:
         logger.error(f"Error processing workflow_created: {e}")
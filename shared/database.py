@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from shared.settings import settings
+from shared.partitions import ensure_partitions, rename_unpartitioned_tables, copy_unpartitioned_rows
 
 engine = create_async_engine(settings.async_database_url, echo=False)
 
@@ -17,4 +18,9 @@ async def get_db():
 
 async def init_db():
     async with engine.begin() as conn:
+        # Tables from before partitioning are moved aside, recreated partitioned and copied back
+        renamed = await rename_unpartitioned_tables(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
+        if renamed:
+            await copy_unpartitioned_rows(conn, renamed)
@@ -2,8 +2,11 @@ import json
 import redis.asyncio as redis
 from shared.settings import settings
 from shared.logger import setup_logger
+from shared.tracing import inject
 
 logger = setup_logger("event_bus")
+# Hot path: rate limited by default, see LOG_RATE_LIMITS
+publish_logger = setup_logger("event_bus.publish")
 
 class EventBus:
     def __init__(self):
@@ -11,8 +14,16 @@ class EventBus:
 
     async def publish(self, channel: str, message: dict):
         try:
-            await self.redis.publish(channel, json.dumps(message, default=str))
-            logger.info(f"Published to {channel}: {message}")
+            # Carry the current trace context so consumers can continue the trace
+            message = inject(message)
+            data = json.dumps(message, default=str)
+            await self.redis.publish(channel, data)
+            # Log by reference; the payload itself is never re-serialized for logging
+            publish_logger.info("Published to %s", channel, extra={
+                "workflow_id": message.get("workflow_id"),
+                "task_id": message.get("task_id"),
+                "bytes": len(data),
+            })
         except Exception as e:
             logger.error(f"Failed to publish to {channel}: {e}")
 
@@ -1,39 +1,183 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import json
-from typing import Any
+import time
+from typing import Any, Optional
+from shared.settings import settings
+
+try:
+    import orjson
+except ImportError: # Optional: falls back to the stdlib encoder
+    orjson = None
+
+def _dumps(entry: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(entry, default=str).decode()
+    return json.dumps(entry, default=str, separators=(",", ":"))
+
+_IMMUTABLE = (str, bytes, int, float, bool, type(None))
+
+def _snapshot(value: Any) -> Any:
+    # Immutable args keep their type so %d / %.2f still work; anything else is rendered now
+    return value if isinstance(value, _IMMUTABLE) else str(value)
+
+def _truncate(value: Any) -> Any:
+    limit = settings.LOG_MAX_FIELD_LENGTH
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...({len(value)} chars)"
+    return value
 
 class StructuredLogger(logging.Logger):
+    def findCaller(self, stack_info=False, stacklevel=1):
+        # Source locations are never emitted, so skip the stack walk on every call
+        return "(unknown file)", 0, "(unknown function)", None
+
     def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, stacklevel=1):
-        if extra is None:
-            extra = {}
-        
+        # Only carry the fields on the record; encoding happens in the writer thread
+        super()._log(level, msg, args, exc_info=exc_info, extra={"fields": extra or {}}, stack_info=stack_info, stacklevel=stacklevel)
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
         # Add standardized fields
         log_entry = {
-            "level": logging.getLevelName(level),
-            "message": msg,
-            **extra
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": _truncate(record.getMessage()),
         }
-        
-        # If there's an exception, add it
-        if exc_info:
-            log_entry["exception"] = self._format_exception(exc_info)
-
-        # Use json.dumps for structured output
-        # In a real heavy-load scenario, we might use orjson
-        super()._log(level, json.dumps(log_entry), args, exc_info=None, extra=None, stack_info=stack_info, stacklevel=stacklevel)
-
-    def _format_exception(self, exc_info):
-        return str(exc_info[1]) if exc_info else None
-
-def setup_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
+
+        # Fields may be callables so that expensive values are only computed for emitted records.
+        # They run here, on the writer thread: they must be pure, thread-safe functions of data
+        # captured at call time, never touching ORM sessions, loop-bound or mutable shared objects.
+        for key, value in getattr(record, "fields", {}).items():
+            log_entry[key] = _truncate(value() if callable(value) else value)
+
+        # If there's an exception, add it (queued records carry it as exc_text, see prepare)
+        if record.exc_info:
+            log_entry["exception"] = str(record.exc_info[1])
+        elif record.exc_text:
+            log_entry["exception"] = record.exc_text
+
+        # Records dropped since the last one that made it through
+        if getattr(record, "suppressed", 0):
+            log_entry["suppressed"] = record.suppressed
+        if getattr(record, "dropped", 0):
+            log_entry["dropped"] = record.dropped
+
+        return _dumps(log_entry)
+
+class SamplingFilter(logging.Filter):
+    """Samples and rate-limits records below WARNING. Warnings and errors always pass."""
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: Optional[float] = None):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        # Token bucket allowing bursts of up to one second's worth of records
+        self.burst = max(1.0, rate_limit or 0.0)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            return False
+
+        if self.rate_limit is not None:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate_limit)
+            self.last_refill = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1.0
+
+        if self.suppressed:
+            record.suppressed = self.suppressed
+            self.suppressed = 0
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without formatting them, and drops rather than blocks when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default implementation formats the whole message here, on the caller's thread.
+        # Formatting is left to the writer, but mutable args and fields are snapshotted now so
+        # the record shows their state at call time rather than whenever the writer gets to it.
+        if isinstance(record.args, dict):
+            record.args = {k: _snapshot(v) for k, v in record.args.items()}
+        elif record.args:
+            record.args = tuple(_snapshot(a) for a in record.args)
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {k: v if callable(v) else _snapshot(v) for k, v in fields.items()}
+        # Like the default implementation, keep only the exception text: the traceback and its
+        # frames must not be held (and kept alive) by the queued record
+        if record.exc_info:
+            record.exc_text = str(record.exc_info[1])
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def _get_queue_handler() -> NonBlockingQueueHandler:
+    """Starts the shared background writer on first use."""
+    global _queue_handler
+    if _queue_handler is None:
+        log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JSONFormatter())
+
+        listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        listener.start()
+        # Flush what is still queued on interpreter shutdown
+        atexit.register(listener.stop)
+
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+    return _queue_handler
+
+def setup_logger(name: str, sample_rate: Optional[float] = None, rate_limit: Optional[float] = None) -> logging.Logger:
+    """
+    Returns a structured logger writing through the shared background queue.
+    Sampling and rate limiting (records/second) default to LOG_SAMPLE_RATES / LOG_RATE_LIMITS.
+    Callable `extra` fields are evaluated lazily on the writer thread and must be thread-safe.
+    """
+    logging.setLoggerClass(StructuredLogger)
+    try:
+        logger = logging.getLogger(name)
+    finally:
+        logging.setLoggerClass(logging.Logger)
+    logger.setLevel(settings.LOG_LEVEL)
+    logger.propagate = False
+
     # Check if handler already exists
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(logging.Formatter('%(message)s'))
-        logger.addHandler(handler)
-    
+        logger.addHandler(_get_queue_handler())
+
+        sample_rate = settings.LOG_SAMPLE_RATES.get(name, 1.0) if sample_rate is None else sample_rate
+        rate_limit = settings.LOG_RATE_LIMITS.get(name) if rate_limit is None else rate_limit
+        if sample_rate < 1.0 or rate_limit is not None:
+            logger.addFilter(SamplingFilter(sample_rate, rate_limit))
+
     return logger
@@ -1,26 +1,65 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Integer, JSON, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, JSON, Boolean, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from shared.database import Base
 
+# Statuses after which a workflow will never be touched again by the engine
+TERMINAL_WORKFLOW_STATUSES = ("COMPLETED", "FAILED")
+
 class Workflow(Base):
     __tablename__ = "workflows"
+    # Range-partitioned by created_at (monthly partitions, see shared/partitions.py).
+    # Postgres requires the partition key to be part of the primary key.
+    __table_args__ = (
+        Index("ix_workflows_created_at", "created_at"),
+        Index("ix_workflows_status_created_at", "status", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     status = Column(String, default="PENDING")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    tasks = relationship("Task", back_populates="workflow", cascade="all, delete-orphan", lazy="selectin")
+    # Set for workflows started from a template; their task rows are created as they are queued
+    template_id = Column(String, nullable=True)
+    template_version = Column(Integer, nullable=True)
+    parameters = Column(JSON, nullable=True)
+
+    tasks = relationship(
+        "Task",
+        primaryjoin="Workflow.id == foreign(Task.workflow_id)",
+        back_populates="workflow",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="Task.created_at",
+    )
 
 class Task(Base):
     __tablename__ = "tasks"
+    # Partitioned by the workflow's created_at (workflow_created_at), so a task
+    # lands in its workflow's monthly partition and both can be archived and
+    # dropped together, while created_at stays the task's own timestamp.
+    # There is no database-level FK: a partitioned workflows table cannot
+    # carry a unique constraint on id alone.
+    __table_args__ = (
+        Index("ix_tasks_workflow_id_name", "workflow_id", "name"),
+        Index("ix_tasks_status_updated_at", "status", "updated_at"),
+        # One row per task of a template run: a redelivered event or repeated completion hits
+        # ON CONFLICT DO NOTHING instead of inserting a duplicate
+        Index(
+            "uq_tasks_template_workflow_id_name", "workflow_id", "name", "workflow_created_at",
+            unique=True, postgresql_where=text("template_id IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (workflow_created_at)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    workflow_id = Column(UUID(as_uuid=True), ForeignKey("workflows.id"), nullable=False)
+    workflow_id = Column(UUID(as_uuid=True), nullable=False)
+    workflow_created_at = Column(DateTime, primary_key=True) # Partition key, copied from the workflow
     name = Column(String, nullable=False)
     task_type = Column(String, nullable=False)
     status = Column(String, default="PENDING")
@@ -30,8 +69,26 @@ class Task(Base):
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     next_task = Column(String, nullable=True) # Name of the next task to run
-    
+    # Set on tasks of template runs, whose successors are built from the template's plan
+    template_id = Column(String, nullable=True)
+    template_version = Column(Integer, nullable=True)
+    parameters = Column(JSON, nullable=True) # The run's parameters, carried over to each successor
+
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    workflow = relationship("Workflow", back_populates="tasks")
+    workflow = relationship(
+        "Workflow",
+        primaryjoin="foreign(Task.workflow_id) == Workflow.id",
+        back_populates="tasks",
+    )
+
+class WorkflowTemplate(Base):
+    __tablename__ = "workflow_templates"
+
+    # Versions are immutable once registered, so compiled plans can be cached indefinitely
+    id = Column(String, primary_key=True)
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    tasks = Column(JSON, nullable=False) # Task definitions, same shape as TaskCreate
+    created_at = Column(DateTime, default=datetime.utcnow)
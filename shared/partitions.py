@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import text
+from shared.settings import settings
+from shared.logger import setup_logger
+
+logger = setup_logger("partitions")
+
+# Range-partitioned tables and their partition key, one partition per calendar month
+PARTITION_KEYS = {"workflows": "created_at", "tasks": "workflow_created_at"}
+PARTITIONED_TABLES = tuple(PARTITION_KEYS)
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + (dt.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m}"
+
+def parse_partition_name(table: str, name: str):
+    """Returns the month start encoded in a partition name, or None for e.g. the default partition."""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], "%Y%m")
+    except ValueError:
+        return None
+
+async def _create_partition(conn, table: str, start: datetime):
+    end = add_months(start, 1)
+    name = partition_name(table, start)
+    bounds = f"FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    key = PARTITION_KEYS[table]
+    in_range = f"{key} >= '{start:%Y-%m-%d}' AND {key} < '{end:%Y-%m-%d}'"
+
+    stray = await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {in_range})"))
+    if not stray:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return
+
+    # Postgres refuses to create a partition while the default partition holds rows in its range
+    # (e.g. after the archiver was down), so move them over with the default detached
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {table}_default"))
+    await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+    await conn.execute(text(f"INSERT INTO {name} SELECT * FROM {table}_default WHERE {in_range}"))
+    await conn.execute(text(f"DELETE FROM {table}_default WHERE {in_range}"))
+    await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT"))
+    logger.warning(f"Moved rows from {table}_default into new partition {name}")
+
+async def is_partitioned(conn, table: str) -> bool:
+    return bool(await conn.scalar(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": table},
+    ))
+
+async def create_partitions(conn, table: str, months: List[datetime]):
+    """Creates the monthly partitions of `table` for the given month starts that do not exist yet."""
+    existing = set(await list_partitions(conn, table))
+    for start in months:
+        if start in existing:
+            continue
+        # One savepoint per partition, so a failure cannot block the others or the caller
+        try:
+            async with conn.begin_nested():
+                await _create_partition(conn, table, start)
+        except Exception as e:
+            logger.error(f"Failed to create partition {partition_name(table, start)}: {e}")
+
+async def ensure_partitions(conn, months_ahead: int = None, now: datetime = None):
+    """Creates the default partition plus monthly partitions from last month up to `months_ahead` months ahead."""
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(now or datetime.utcnow())
+
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(conn, table):
+            raise RuntimeError(
+                f"Table {table} is not partitioned; it was created before partitioning and is "
+                f"migrated by init_db (api-gateway start-up)"
+            )
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+        await create_partitions(conn, table, [add_months(current, offset) for offset in range(-1, months_ahead + 1)])
+
+async def rename_unpartitioned_tables(conn) -> List[str]:
+    """
+    Renames `workflows` / `tasks` tables created before partitioning to `{table}_unpartitioned`,
+    so that create_all can create the partitioned tables. Returns the renamed tables.
+    """
+    renamed = []
+    for table in PARTITIONED_TABLES:
+        if await conn.scalar(text("SELECT to_regclass(:table) IS NULL"), {"table": table}):
+            continue
+        if await is_partitioned(conn, table):
+            continue
+        legacy = f"{table}_unpartitioned"
+        await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        # The primary key index keeps its name, which the new table's primary key needs
+        pkey = await conn.scalar(
+            text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p'"),
+            {"table": legacy},
+        )
+        if pkey:
+            await conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {pkey} TO {legacy}_pkey"))
+        logger.warning(f"Renamed unpartitioned table {table} to {legacy} for migration")
+        renamed.append(table)
+    return renamed
+
+async def copy_unpartitioned_rows(conn, tables: List[str]):
+    """
+    Copies the rows of tables renamed by rename_unpartitioned_tables into the partitioned tables,
+    then drops the old tables. Tasks get workflow_created_at from their workflow.
+    """
+    if "workflows" in tables:
+        # Partitions for every month with data, rather than piling old rows into the default partition
+        result = await conn.execute(text(
+            "SELECT DISTINCT date_trunc('month', created_at) FROM workflows_unpartitioned WHERE created_at IS NOT NULL"
+        ))
+        months = sorted(month_start(row[0]) for row in result)
+        for table in PARTITIONED_TABLES:
+            await create_partitions(conn, table, months)
+
+        await conn.execute(text(
+            "INSERT INTO workflows (id, name, status, created_at, updated_at) "
+            "SELECT id, name, status, COALESCE(created_at, now() AT TIME ZONE 'utc'), updated_at "
+            "FROM workflows_unpartitioned"
+        ))
+
+    if "tasks" in tables:
+        # Joined against the new workflows table, so rows with a NULL created_at get the filled-in value
+        await conn.execute(text(
+            "INSERT INTO tasks (id, workflow_id, workflow_created_at, name, task_type, status, payload, result, "
+            "error, retry_count, max_retries, next_task, created_at, updated_at) "
+            "SELECT t.id, t.workflow_id, w.created_at, t.name, t.task_type, t.status, t.payload, t.result, "
+            "t.error, t.retry_count, t.max_retries, t.next_task, t.created_at, t.updated_at "
+            "FROM tasks_unpartitioned t JOIN workflows w ON w.id = t.workflow_id"
+        ))
+
+    # tasks_unpartitioned holds the foreign key to workflows_unpartitioned, so it goes first
+    for table in ("tasks", "workflows"):
+        if table in tables:
+            await conn.execute(text(f"DROP TABLE {table}_unpartitioned"))
+            logger.info(f"Migrated {table} to a partitioned table")
+
+async def list_partitions(conn, table: str) -> List[datetime]:
+    """Returns the month starts of the existing monthly partitions of `table`, oldest first."""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table})
+    months = [parse_partition_name(table, row[0]) for row in result]
+    return sorted(m for m in months if m is not None)
+
+async def drop_partition(conn, table: str, start: datetime):
+    name = partition_name(table, start)
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    await conn.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"Dropped partition {name}")
@@ -39,11 +39,48 @@ class WorkflowResponse(WorkflowBase):
     status: str
     created_at: datetime
     updated_at: datetime
+    template_id: Optional[str] = None
+    template_version: Optional[int] = None
+    parameters: Optional[Dict[str, Any]] = None
     tasks: List[TaskResponse]
 
     class Config:
         from_attributes = True
 
+class WorkflowTemplateCreate(BaseModel):
+    id: str
+    name: str
+    tasks: List[TaskCreate]
+
+class WorkflowTemplateResponse(BaseModel):
+    id: str
+    version: int
+    name: str
+    tasks: List[TaskBase]
+    start_tasks: List[str]
+    parameters: List[str] # Placeholders ({{name}}) that every run must supply
+    created_at: datetime
+
+class WorkflowRunCreate(BaseModel):
+    version: Optional[int] = None # Latest version if omitted
+    name: Optional[str] = None # Template name if omitted
+    parameters: Dict[str, Any] = {}
+
+class CriticalPathSegment(BaseModel):
+    service: str
+    name: str
+    span_id: str
+    start_ns: int
+    end_ns: int
+    duration_ms: float
+
+class TraceBreakdown(BaseModel):
+    workflow_id: UUID
+    trace_id: str
+    total_ms: float
+    stages: Dict[str, float] # Critical-path time per stage
+    critical_path: List[CriticalPathSegment]
+
 # --- Event Models ---
 
 class EventPayload(BaseModel):
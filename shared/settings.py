@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     POSTGRES_USER: str = "postgres"
@@ -12,6 +12,29 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     
     DATABASE_URL: Optional[str] = None
+
+    # Partitioning / retention
+    PARTITION_MONTHS_AHEAD: int = 2
+    RETENTION_DAYS: int = 30
+    ARCHIVE_DIR: str = "/data/archive"
+    ARCHIVE_BATCH_SIZE: int = 500
+
+    # Tracing
+    TRACE_TTL_SECONDS: int = 86400
+    TRACE_EXPORT_FILE: Optional[str] = None # Optional OTLP/JSON lines file
+    TRACE_QUEUE_SIZE: int = 10000
+    TRACE_BATCH_SIZE: int = 500
+    TRACE_FLUSH_INTERVAL_SECONDS: float = 0.2
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_MAX_FIELD_LENGTH: int = 1024
+    LOG_SAMPLE_RATES: Dict[str, float] = {} # logger name -> fraction of INFO/DEBUG records kept
+    LOG_RATE_LIMITS: Dict[str, float] = {"event_bus.publish": 50.0} # logger name -> records/second
+
+    # Workflow templates
+    TEMPLATE_CACHE_SIZE: int = 256 # Compiled execution plans kept per process
     
     @property
     def async_database_url(self) -> str:
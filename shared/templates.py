@@ -0,0 +1,183 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from shared.models import Task, WorkflowTemplate
+from shared.settings import settings
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+@dataclass(frozen=True)
+class TaskSpec:
+    name: str
+    task_type: str
+    payload: Dict[str, Any]
+    next_task: Optional[str]
+    max_retries: int
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """A validated template version, compiled once: start nodes and successors are precomputed."""
+    template_id: str
+    version: int
+    name: str
+    tasks: Dict[str, TaskSpec]
+    start_tasks: Tuple[str, ...]
+    successors: Dict[str, Optional[str]]
+    parameters: FrozenSet[str]
+
+    def missing_parameters(self, parameters: Dict[str, Any]) -> List[str]:
+        return sorted(self.parameters - parameters.keys())
+
+    def task_values(self, name: str, workflow_id, workflow_created_at: datetime, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Column values of the task row for `name`. The parameters ride along so successors need no workflow lookup."""
+        spec = self.tasks[name]
+        return {
+            "workflow_id": workflow_id,
+            # Partition key: the row lands in the workflow's partition
+            "workflow_created_at": workflow_created_at,
+            "name": spec.name,
+            "task_type": spec.task_type,
+            "payload": render(spec.payload, parameters),
+            "next_task": spec.next_task,
+            "max_retries": spec.max_retries,
+            "template_id": self.template_id,
+            "template_version": self.version,
+            "parameters": parameters,
+        }
+
+async def insert_queued_task(db, values: Dict[str, Any]):
+    """
+    Inserts a template run's task row as QUEUED and returns its id, or None if the row already
+    exists (redelivered event, repeated completion) and has therefore been queued before.
+    """
+    stmt = (
+        insert(Task)
+        .values(status="QUEUED", **values)
+        .on_conflict_do_nothing(
+            index_elements=[Task.workflow_id, Task.name, Task.workflow_created_at],
+            index_where=Task.template_id.isnot(None),
+        )
+        .returning(Task.id)
+    )
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+def _placeholders(value: Any) -> set:
+    if isinstance(value, str):
+        return set(PLACEHOLDER.findall(value))
+    if isinstance(value, dict):
+        return set().union(*(_placeholders(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_placeholders(v) for v in value))
+    return set()
+
+def render(value: Any, parameters: Dict[str, Any]) -> Any:
+    """Substitutes {{name}} placeholders. A string that is exactly one placeholder takes the parameter's own type."""
+    if isinstance(value, str):
+        match = PLACEHOLDER.fullmatch(value)
+        if match:
+            return parameters[match.group(1)]
+        return PLACEHOLDER.sub(lambda m: str(parameters[m.group(1)]), value)
+    if isinstance(value, dict):
+        return {k: render(v, parameters) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render(v, parameters) for v in value]
+    return value
+
+def compile_plan(template_id: str, version: int, name: str, tasks: List[Dict[str, Any]]) -> ExecutionPlan:
+    """Validates a task chain and compiles it. Raises ValueError if the chain is invalid."""
+    if not tasks:
+        raise ValueError("Template has no tasks")
+
+    specs = {}
+    for task in tasks:
+        spec = TaskSpec(
+            name=task["name"],
+            task_type=task["task_type"],
+            payload=task.get("payload") or {},
+            next_task=task.get("next_task"),
+            max_retries=task.get("max_retries", 3),
+        )
+        if spec.name in specs:
+            raise ValueError(f"Duplicate task name: {spec.name}")
+        specs[spec.name] = spec
+
+    for spec in specs.values():
+        if spec.next_task is not None and spec.next_task not in specs:
+            raise ValueError(f"Task {spec.name} references unknown next task {spec.next_task}")
+
+    successors = {spec.name: spec.next_task for spec in specs.values()}
+    all_next_tasks = {n for n in successors.values() if n}
+    start_tasks = tuple(n for n in specs if n not in all_next_tasks)
+    if not start_tasks:
+        raise ValueError("Template has no start task (cycle)")
+
+    # Walk each chain; every task must be reached and no chain may loop back on itself
+    reachable = set()
+    for start in start_tasks:
+        path = set()
+        current = start
+        while current and current not in reachable:
+            reachable.add(current)
+            path.add(current)
+            current = successors[current]
+        if current in path:
+            raise ValueError(f"Task chain starting at {start} contains a cycle")
+    unreachable = sorted(set(specs) - reachable)
+    if unreachable:
+        raise ValueError(f"Tasks not reachable from a start task: {', '.join(unreachable)}")
+
+    return ExecutionPlan(
+        template_id=template_id,
+        version=version,
+        name=name,
+        tasks=specs,
+        start_tasks=start_tasks,
+        successors=successors,
+        parameters=frozenset(_placeholders([spec.payload for spec in specs.values()])),
+    )
+
+class PlanCache:
+    """Per-process LRU of compiled plans. Template versions are immutable, so entries never go stale."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.plans: "OrderedDict[Tuple[str, int], ExecutionPlan]" = OrderedDict()
+
+    def put(self, plan: ExecutionPlan):
+        self.plans[(plan.template_id, plan.version)] = plan
+        self.plans.move_to_end((plan.template_id, plan.version))
+        while len(self.plans) > self.max_size:
+            self.plans.popitem(last=False)
+
+    async def get(self, db, template_id: str, version: Optional[int] = None) -> Optional[ExecutionPlan]:
+        """Returns the plan for a template version (latest if not given), or None if it does not exist."""
+        if version is None:
+            version = await db.scalar(
+                select(func.max(WorkflowTemplate.version)).where(WorkflowTemplate.id == template_id)
+            )
+            if version is None:
+                return None
+
+        key = (template_id, version)
+        plan = self.plans.get(key)
+        if plan is not None:
+            self.plans.move_to_end(key)
+            return plan
+
+        result = await db.execute(
+            select(WorkflowTemplate).where(WorkflowTemplate.id == template_id, WorkflowTemplate.version == version)
+        )
+        template = result.scalar_one_or_none()
+        if template is None:
+            return None
+
+        plan = compile_plan(template.id, template.version, template.name, template.tasks)
+        self.put(plan)
+        return plan
+
+plan_cache = PlanCache(settings.TEMPLATE_CACHE_SIZE)
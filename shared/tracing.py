@@ -0,0 +1,314 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+import redis.asyncio as redis
+from shared.settings import settings
+from shared.logger import setup_logger
+
+logger = setup_logger("tracing")
+
+@dataclass
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        # W3C trace-context header format
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @classmethod
+    def from_traceparent(cls, value: str) -> Optional["SpanContext"]:
+        parts = value.split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return cls(trace_id=parts[1], span_id=parts[2])
+
+@dataclass
+class Span:
+    service: str
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(trace_id=self.trace_id, span_id=self.span_id)
+
+_current_span: ContextVar[Optional[SpanContext]] = ContextVar("current_span", default=None)
+
+def trace_id_for(workflow_id) -> str:
+    """Every workflow is its own trace: the trace id is the workflow UUID in hex."""
+    return uuid.UUID(str(workflow_id)).hex
+
+def trace_id_from(message: dict) -> Optional[str]:
+    """Trace id of an event's workflow, or None (a fresh trace) if it carries no valid workflow_id."""
+    try:
+        return trace_id_for(message["workflow_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+def inject(message: dict) -> dict:
+    """Adds the current trace context and publish time to an outgoing event."""
+    ctx = _current_span.get()
+    if ctx is None:
+        return message
+    return {**message, "traceparent": ctx.traceparent, "published_at": time.time_ns()}
+
+def extract(message: dict) -> Optional[SpanContext]:
+    value = message.get("traceparent")
+    return SpanContext.from_traceparent(value) if value else None
+
+# --- Export ---
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": {"stringValue": str(v)}} for k, v in attributes.items()]
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """Builds an OTLP/JSON ExportTraceServiceRequest, one resource per service."""
+    by_service = defaultdict(list)
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_span_id:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        by_service[span.service].append(otlp_span)
+
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": service})},
+                "scopeSpans": [{"scope": {"name": "shared.tracing"}, "spans": otlp_spans}],
+            }
+            for service, otlp_spans in by_service.items()
+        ]
+    }
+
+def _append_line(path: str, line: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+class SpanStore:
+    """
+    Keeps finished spans in Redis, one list per trace, so any service can read a whole trace back.
+    Spans are queued in-process and written in batches by a background task, off the request path;
+    spans still queued when the process exits are lost.
+    """
+
+    def __init__(self):
+        self.redis = redis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}", encoding="utf-8", decode_responses=True)
+        # Created on first use, inside the running loop
+        self.queue: Optional[asyncio.Queue] = None
+        self.flusher: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def submit(self, span: Span):
+        """Queues a finished span for export without waiting on Redis. Drops it if the queue is full."""
+        if self.flusher is None or self.flusher.done():
+            self.queue = asyncio.Queue(maxsize=settings.TRACE_QUEUE_SIZE)
+            self.flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        try:
+            self.queue.put_nowait(span)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Let spans of the same trace accumulate, then take what is queued
+            await asyncio.sleep(settings.TRACE_FLUSH_INTERVAL_SECONDS)
+            while len(batch) < settings.TRACE_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            if self.dropped:
+                logger.warning(f"Dropped {self.dropped} spans, export queue full")
+                self.dropped = 0
+            # Tracing must never take a service down
+            try:
+                await self.save(batch)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    async def save(self, spans: List[Span]):
+        """Writes spans with one RPUSH per trace in a single pipeline, and one file append."""
+        records = defaultdict(list)
+        for span in spans:
+            records[span.trace_id].append(json.dumps(asdict(span), default=str))
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for trace_id, trace_records in records.items():
+                key = f"trace:{trace_id}"
+                pipe.rpush(key, *trace_records)
+                pipe.expire(key, settings.TRACE_TTL_SECONDS)
+            await pipe.execute()
+
+        if settings.TRACE_EXPORT_FILE:
+            await asyncio.to_thread(_append_line, settings.TRACE_EXPORT_FILE, json.dumps(to_otlp(spans)))
+
+    async def load(self, trace_id: str) -> List[Span]:
+        records = await self.redis.lrange(f"trace:{trace_id}", 0, -1)
+        return [Span(**json.loads(record)) for record in records]
+
+span_store = SpanStore()
+
+# --- Recording ---
+
+class Tracer:
+    def __init__(self, service: str):
+        self.service = service
+
+    def _export(self, span: Span):
+        # Tracing must never take a service down
+        try:
+            span_store.submit(span)
+        except Exception as e:
+            logger.warning(f"Failed to export span {span.name}: {e}")
+
+    @asynccontextmanager
+    async def span(self, name: str, parent: Optional[SpanContext] = None, trace_id: Optional[str] = None, **attributes):
+        """Times the enclosed block. Events published inside it carry this span as their parent."""
+        parent = parent or _current_span.get()
+        if parent is not None:
+            trace_id = parent.trace_id
+        elif trace_id is None:
+            trace_id = os.urandom(16).hex()
+
+        span = Span(
+            service=self.service,
+            name=name,
+            trace_id=trace_id,
+            span_id=new_span_id(),
+            parent_span_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span.context)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._export(span)
+
+    async def consume(self, channel: str, message: dict) -> Optional[SpanContext]:
+        """Records the Redis transit span of an inbound event and returns the parent for the consumer's spans."""
+        parent = extract(message)
+        published_at = message.get("published_at")
+        if parent is None or published_at is None:
+            return parent
+
+        span = Span(
+            service=self.service,
+            name=f"redis.transit {channel}",
+            trace_id=parent.trace_id,
+            span_id=new_span_id(),
+            parent_span_id=parent.span_id,
+            start_ns=int(published_at),
+            end_ns=time.time_ns(),
+            attributes={"messaging.destination": channel},
+        )
+        self._export(span)
+        return span.context
+
+# --- Analysis ---
+
+def critical_path(spans: List[Span]) -> List[Dict[str, Any]]:
+    """
+    Computes the critical path of a trace, Jaeger style: starting from the latest-finishing
+    descendant and walking backwards, every time slice is attributed to the deepest span
+    responsible for it. Time not covered by any span is reported as "untracked".
+    """
+    if not spans:
+        return []
+
+    by_id = {s.span_id: s for s in spans}
+    start = min(s.start_ns for s in spans)
+    # Virtual root: adopts spans whose parent is unknown (e.g. failure detector spans)
+    root = Span(service="", name="untracked", trace_id=spans[0].trace_id, span_id="", start_ns=start, end_ns=start)
+    children = defaultdict(list)
+    for s in spans:
+        children[s.parent_span_id if s.parent_span_id in by_id else ""].append(s)
+
+    # Consumers' spans may outlive their parents, so a span "ends" when its last descendant does
+    order = [root]
+    for s in order:
+        order.extend(children[s.span_id])
+    effective_end = {}
+    for s in reversed(order):
+        effective_end[s.span_id] = max([s.end_ns] + [effective_end[c.span_id] for c in children[s.span_id]])
+
+    segments = []
+
+    def emit(span: Span, seg_start: int, seg_end: int):
+        segments.append((span, seg_start, seg_end))
+
+    def sorted_children(span: Span) -> List[Span]:
+        return sorted(children[span.span_id], key=lambda c: effective_end[c.span_id], reverse=True)
+
+    # Iterative DFS: frames are [span, cursor, children, next child index]
+    stack = [[root, effective_end[""], sorted_children(root), 0]]
+    while stack:
+        frame = stack[-1]
+        span, cursor, kids, i = frame
+        descended = False
+        while i < len(kids):
+            child = kids[i]
+            i += 1
+            if child.start_ns >= cursor:
+                continue
+            child_end = min(effective_end[child.span_id], cursor)
+            if child_end < cursor:
+                emit(span, child_end, cursor)
+            frame[1], frame[3] = child.start_ns, i
+            stack.append([child, child_end, sorted_children(child), 0])
+            descended = True
+            break
+        if descended:
+            continue
+        stack.pop()
+        if span.start_ns < frame[1]:
+            emit(span, span.start_ns, frame[1])
+
+    # Segments were collected back to front; merge adjacent slices of the same span
+    path = []
+    for span, seg_start, seg_end in reversed(segments):
+        if path and path[-1]["span_id"] == span.span_id and path[-1]["end_ns"] == seg_start:
+            path[-1]["end_ns"] = seg_end
+            continue
+        path.append({
+            "service": span.service,
+            "name": span.name,
+            "span_id": span.span_id,
+            "start_ns": seg_start,
+            "end_ns": seg_end,
+        })
+
+    for segment in path:
+        segment["duration_ms"] = (segment["end_ns"] - segment["start_ns"]) / 1e6
+    return path